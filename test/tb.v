@@ -6,12 +6,15 @@
 */
 module tb ();
 
-  // Dump the signals to a VCD file. You can view it with gtkwave.
+  // Waveforms are dumped by cocotb when running `make WAVES=1`. Gate-level
+  // runs still write tb.vcd (DUMP_VCD is set by the Makefile for GATES=yes).
+`ifdef DUMP_VCD
   initial begin
     $dumpfile("tb.vcd");
     $dumpvars(0, tb);
     #1;
   end
+`endif
     reg clk;
     reg rst_n;
     reg [7:0] ui_in;
@@ -20,6 +23,32 @@ module tb ();
     wire [7:0] uio_out;
     wire [7:0] uio_oe;
     reg ena;
+
+    // Single-bit views of the outputs the test waits on; Icarus can't put
+    // edge triggers on bit-selects of uo_out / uio_out
+    wire bnn_ready = uo_out[5];
+    wire ultrasonic_trigger = uio_out[1];
+
+    // Count XCLK (uio_out[4]) toggles so the test can check them with a
+    // couple of reads instead of sampling uio_out every cycle
+    reg xclk_prev;
+    reg [7:0] xclk_toggles;
+    always @(posedge clk or negedge rst_n) begin
+        if (!rst_n) begin
+            xclk_prev <= 1'b0;
+            xclk_toggles <= 8'd0;
+        end else begin
+            xclk_prev <= uio_out[4];
+            if (uio_out[4] != xclk_prev)
+                xclk_toggles <= xclk_toggles + 8'd1;
+        end
+    end
+
+    // Generate the 100 KHz (10 us) clock in HDL so cocotb doesn't have to
+    // service every clock edge from Python
+    initial clk = 1'b0;
+    always #5000 clk = ~clk;
+
     // Instantiate DUT
     tt_um_microgreen_bnn user_project (
 `ifdef GL_TEST
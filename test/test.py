@@ -1,20 +1,59 @@
 # SPDX-FileCopyrightText: © 2024 Tiny Tapeout
 # SPDX-License-Identifier: Apache-2.0
 
-import cocotb
-from cocotb.clock import Clock
-from cocotb.triggers import ClockCycles, RisingEdge
-
-@cocotb.test()
-async def test_project(dut):
-    dut._log.info("Start")
-
-    # Set the clock period to 10 us (100 KHz)
-    clock = Clock(dut.clk, 10, units="us")
-    cocotb.start_soon(clock.start())
+import logging
 
+import cocotb
+from cocotb.triggers import ClockCycles, First, RisingEdge, Timer
+
+# Clock period generated by tb.v
+_CLK_PERIOD_US = 10
+
+# uio_in camera sync bits
+_VSYNC = 0x80
+_HREF = 0x40
+
+# Simulated frame: a few pixels are enough for pixel_count and the feature
+# accumulators to register a frame. Each pixel is two bytes, one per clock.
+_FRAME_PIXELS = 4
+_FRAME_PIXEL = 0x55  # Some pixel data
+
+# (uio_in, cycles) for each phase of the simulated frame
+_FRAME_PHASES = (
+    (_VSYNC, 2),                          # VSYNC rising (frame start)
+    (_VSYNC | _HREF, 2 * _FRAME_PIXELS),  # Pixel data during "frame"
+    (_VSYNC, 2),                          # End HREF
+    (0, 4),                               # VSYNC falling (frame end - triggers inference)
+)
+
+
+async def _wait_high(signal, timeout_cycles):
+    """Wait for single-bit ``signal`` to be high, giving up after ``timeout_cycles`` clocks.
+
+    Returns True if the signal is (or goes) high in time, False otherwise.
+    """
+    if int(signal.value):
+        return True
+    rise = RisingEdge(signal)
+    fired = await First(rise, Timer(timeout_cycles * _CLK_PERIOD_US, units="us"))
+    return fired is rise
+
+
+async def drive_frame(dut):
+    """Drive one camera frame on VSYNC/HREF; VSYNC falling triggers inference."""
+    clk = dut.clk
+    uio_in = dut.uio_in
+    # Pixel data is only sampled while HREF is high, so it can be set up front
+    dut.ui_in.value = _FRAME_PIXEL
+    for sync, cycles in _FRAME_PHASES:
+        uio_in.value = sync
+        await ClockCycles(clk, cycles)
+
+
+async def _common_setup(dut):
+    """Reset the design and check that uio_out comes out of reset fully driven."""
     # Reset
-    dut._log.info("Reset")
+    dut._log.debug("Reset")
     dut.ena.value = 0
     dut.rst_n.value = 0
     dut.ui_in.value = 0
@@ -23,111 +62,90 @@ async def test_project(dut):
 
     dut.ena.value = 1
     dut.rst_n.value = 1
-    await ClockCycles(dut.clk, 10)
-
-    # Wait for uio_out to stabilize
-    for _ in range(20):
-        binstr = dut.uio_out.value.binstr.lower()
-        if 'z' not in binstr and 'x' not in binstr:
-            break
-        await RisingEdge(dut.clk)
-    else:
-        dut._log.warning(f"uio_out unresolved: {dut.uio_out.value.binstr}")
+    # uio_out only depends on camera_clk_div and ultrasonic_trigger, which are
+    # asynchronously reset, so two cycles are enough for the check below.
+    # avg_* and height_pixels have no reset and stay X until a frame is
+    # processed, but they only reach uo_out once frame_ready is set.
+    await ClockCycles(dut.clk, 2)
+
+    # uio_out is fully driven once reset has been released
+    value = dut.uio_out.value
+    if not value.is_resolvable:
+        dut._log.warning("uio_out unresolved: %s", value.binstr)
         raise AssertionError("uio_out signal contains unresolved 'z' or 'x' bits")
 
-    dut._log.info("\u2713 Output signals properly driven")
+    dut._log.debug("\u2713 Output signals properly driven")
+
 
-    # Test 1: Camera Clock (XCLK) Generation
-    dut._log.info("Test 1: Camera Clock (XCLK) Generation")
-    prev_val = dut.uio_out.value.integer & (1 << 4)
-    toggles = 0
+@cocotb.test()
+async def test_xclk(dut):
+    """Camera clock (XCLK) generation"""
+    await _common_setup(dut)
 
-    for _ in range(50):
-        await RisingEdge(dut.clk)
-        current_val = dut.uio_out.value.integer & (1 << 4)
-        if current_val != prev_val:
-            toggles += 1
-            prev_val = current_val
+    # tb.v counts the toggles (mod 256) in HDL
+    start = int(dut.xclk_toggles.value)
+    await ClockCycles(dut.clk, 50)
+    toggles = (int(dut.xclk_toggles.value) - start) & 0xFF
 
     assert toggles > 2, "XCLK not toggling as expected"
-    dut._log.info(f"  \u2713 XCLK toggling correctly ({toggles} toggles observed)")
+    dut._log.info("  \u2713 XCLK toggling correctly (%d toggles observed)", toggles)
+
 
-    # Test 2: Ultrasonic Trigger
-    dut._log.info("Test 2: Ultrasonic Trigger Generation")
-    trigger_detected = False
+@cocotb.test()
+async def test_ultrasonic_trigger(dut):
+    """Ultrasonic trigger generation"""
+    await _common_setup(dut)
 
-    for _ in range(5000):
-        await RisingEdge(dut.clk)
-        trigger = (dut.uio_out.value.integer >> 1) & 0b1
-        if trigger:
-            trigger_detected = True
-            break
+    trigger_detected = await _wait_high(dut.ultrasonic_trigger, 5000)
 
     assert trigger_detected, "Ultrasonic trigger not detected"
     dut._log.info("  \u2713 Ultrasonic trigger pulse detected")
 
-    # Test 3: Simulate Frame and Check BNN
-    dut._log.info("Test 3: BNN Inference")
 
-    # Simulate VSYNC rising (frame start)
-    dut.uio_in.value = 0b10000000  # VSYNC high
-    await ClockCycles(dut.clk, 10)
-
-    # Simulate some pixel data during "frame"
-    dut.uio_in.value = 0b11000000  # VSYNC high + HREF high
-    dut.ui_in.value = 0x55  # Some pixel data
-    await ClockCycles(dut.clk, 20)
-
-    # End HREF
-    dut.uio_in.value = 0b10000000  # VSYNC high, HREF low
-    await ClockCycles(dut.clk, 10)
+@cocotb.test()
+async def test_bnn_inference(dut):
+    """Simulate a frame and check the BNN result"""
+    await _common_setup(dut)
 
-    # Simulate VSYNC falling (frame end - triggers inference)
-    dut.uio_in.value = 0b00000000  # VSYNC low
-    await ClockCycles(dut.clk, 10)
+    # bnn_ready is already high out of reset, so the frame has to finish
+    # before its result can be read
+    await drive_frame(dut)
 
     # Wait for BNN to complete
-    bnn_ready = False
-    for _ in range(1000):
-        await RisingEdge(dut.clk)
-        binstr = dut.uo_out.value.binstr.lower()
-        if 'x' not in binstr and 'z' not in binstr:
-            ready = (dut.uo_out.value.integer >> 5) & 0b1
-            if ready:
-                bnn_ready = True
-                break
+    bnn_ready = await _wait_high(dut.bnn_ready, 1000)
 
     if not bnn_ready:
-        dut._log.warning(f"BNN not ready, uo_out = {dut.uo_out.value.binstr}")
+        dut._log.warning("BNN not ready, uo_out = %s", dut.uo_out.value.binstr)
         dut._log.info("  \u26a0 BNN inference not triggered (expected without real camera)")
     else:
-        prediction = (dut.uo_out.value.integer >> 4) & 0b1
-        buzzer = (dut.uo_out.value.integer >> 7) & 0b1
-        led = (dut.uo_out.value.integer >> 6) & 0b1
-        hidden = dut.uo_out.value.integer & 0x0F
+        value = dut.uo_out.value
+        assert value.is_resolvable, f"uo_out has unresolved bits: {value.binstr}"
 
-        dut._log.info(f"  \u2713 BNN Ready | Prediction: {prediction} | Hidden: {bin(hidden)}")
-        dut._log.info(f"  Buzzer: {buzzer}, LED: {led}")
+        # The fields are only reported, so skip decoding them when INFO is filtered out
+        if dut._log.isEnabledFor(logging.INFO):
+            v = int(value)
+            prediction = (v >> 4) & 0b1
+            buzzer = (v >> 7) & 0b1
+            led = (v >> 6) & 0b1
+            hidden = v & 0x0F
 
-    # Test 4: Check that outputs are driven (even if not ready)
-    dut._log.info("Test 4: Output Signal Integrity")
+            dut._log.info(
+                "  \u2713 BNN Ready | Prediction: %d | Hidden: %s | Buzzer: %d, LED: %d",
+                prediction, bin(hidden), buzzer, led,
+            )
 
-    for _ in range(10):
-        await RisingEdge(dut.clk)
-        binstr = dut.uo_out.value.binstr.lower()
-        if 'z' in binstr:
-            raise AssertionError(f"uo_out has high-Z bits: {binstr}")
 
-    dut._log.info("  \u2713 All outputs properly driven")
+@cocotb.test()
+async def test_output_integrity(dut):
+    """Check that outputs are driven after a frame (even if not ready)"""
+    await _common_setup(dut)
+    # The frame loads the unreset avg_* / height_pixels features into the BNN,
+    # which is the point where they could leave uo_out unresolved
+    await drive_frame(dut)
 
-    dut._log.info("="*70)
-    dut._log.info("ALL TESTS PASSED! \u2713")
-    dut._log.info("="*70)
-    dut._log.info("")
-    dut._log.info("Camera interface: XCLK generation working")
-    dut._log.info("Ultrasonic interface: Trigger pulses working")
-    dut._log.info("Output signals: Properly driven")
-    dut._log.info("")
-    dut._log.info("Note: Full BNN inference requires real camera frames")
-    dut._log.info("Hardware testing will validate complete operation")
-    dut._log.info("="*70)
+    await ClockCycles(dut.clk, 10)
+    value = dut.uo_out.value
+    if not value.is_resolvable:
+        raise AssertionError(f"uo_out has unresolved bits: {value.binstr}")
+
+    dut._log.info("  \u2713 All outputs properly driven")
@@ -0,0 +1,58 @@
+# SPDX-FileCopyrightText: © 2024 Tiny Tapeout
+# SPDX-License-Identifier: Apache-2.0
+
+# Runs each cocotb test in test.py in its own simulator process, so they can
+# be spread across cores with `pytest -n auto test_runner.py`.
+
+import importlib.util
+import os
+from pathlib import Path
+
+import cocotb
+import pytest
+from cocotb.runner import get_runner
+
+TEST_DIR = Path(__file__).resolve().parent
+SRC_DIR = TEST_DIR.parent / "src"
+
+
+def _cocotb_testcases():
+    """Names of the @cocotb.test() coroutines in test.py, in definition order."""
+    # Loaded by path under its own name: plain `import test` can pick up the
+    # standard library's test package instead
+    spec = importlib.util.spec_from_file_location("_microgreen_tests", TEST_DIR / "test.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return [name for name, obj in vars(module).items() if isinstance(obj, cocotb.test)]
+
+
+TESTCASES = _cocotb_testcases()
+
+# Same simulator flags test/Makefile adds on top of cocotb's own makefiles
+BUILD_ARGS = {
+    # tb.v generates the clock with # delays, and only tb.v has a `timescale
+    "verilator": ["--timing", "--timescale", "1ns/1ps",
+                  "--x-assign", "fast", "--x-initial", "fast", "-O3"],
+}
+
+
+@pytest.mark.parametrize("testcase", TESTCASES)
+def test_rtl(testcase):
+    sim = os.getenv("SIM", "icarus")
+    runner = get_runner(sim)
+    # Separate build directory per testcase so parallel workers don't clobber each other
+    build_dir = TEST_DIR / "sim_build" / f"rtl_{testcase}"
+
+    runner.build(
+        verilog_sources=[SRC_DIR / "project.v", TEST_DIR / "tb.v"],
+        includes=[SRC_DIR],
+        hdl_toplevel="tb",
+        build_args=BUILD_ARGS.get(sim, []),
+        build_dir=build_dir,
+    )
+    runner.test(
+        hdl_toplevel="tb",
+        test_module="test",
+        testcase=testcase,
+        build_dir=build_dir,
+    )